@@ -0,0 +1,248 @@
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+from functools import wraps
+from urllib.parse import quote
+import asyncio
+import concurrent.futures
+import datetime
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import jwt
+
+from common.instrumentation import register_instrumentation
+from common.log_pipeline import configure_logging
+
+# Configure logging
+log_pipeline = configure_logging('account-service', logger_names=[__name__])
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+CORS(app)
+metrics = register_instrumentation(app, 'account-service')
+log_pipeline.register_metrics(metrics)
+
+# Configuration
+PORT = int(os.environ.get('PORT', 3000))
+# Must match auth-service's SECRET_KEY so tokens can be verified here
+SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://auth-service:5000')
+ORDER_SERVICE_URL = os.environ.get('ORDER_SERVICE_URL', 'http://order-service:3000')
+PRODUCT_SERVICE_URL = os.environ.get('PRODUCT_SERVICE_URL', 'http://product-service:3000')
+
+# Per-request deadlines in seconds, from connecting to reading the whole body
+AUTH_TIMEOUT = float(os.environ.get('AUTH_TIMEOUT', 2))
+ORDER_TIMEOUT = float(os.environ.get('ORDER_TIMEOUT', 3))
+PRODUCT_TIMEOUT = float(os.environ.get('PRODUCT_TIMEOUT', 2))
+# Budget for all product lookups of one account; those still running are reported as errors
+PRODUCTS_TIMEOUT = float(os.environ.get('PRODUCTS_TIMEOUT', 3))
+
+# Connection pool limits for the shared upstream session
+POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 100))
+POOL_SIZE_PER_HOST = int(os.environ.get('UPSTREAM_POOL_SIZE_PER_HOST', 30))
+
+
+class UpstreamClient:
+    """Pooled aiohttp session running on a background event loop.
+
+    Flask views are synchronous, so each worker process runs one event loop
+    in a daemon thread and views submit coroutines to it. Keeping the loop
+    and session alive between requests lets keep-alive connections to the
+    upstream services be reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=POOL_SIZE, limit_per_host=POOL_SIZE_PER_HOST)
+        return aiohttp.ClientSession(connector=connector)
+
+    def _ensure_started(self):
+        # Event loop threads do not survive fork(), so start one per worker
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='upstream-client', daemon=True).start()
+            self._session = asyncio.run_coroutine_threadsafe(self._create_session(), loop).result()
+            self._loop = loop
+            self._pid = os.getpid()
+
+    def run(self, coroutine_function, *args, timeout: float):
+        """Run `coroutine_function(session, *args)` on the loop and wait for its result"""
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coroutine_function(self._session, *args), self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Stop the coroutine so it does not keep holding pooled connections
+            future.cancel()
+            raise
+
+
+upstreams = UpstreamClient()
+
+
+async def get_json(session: aiohttp.ClientSession, name: str, url: str,
+                   headers: Optional[Dict], params: Optional[Dict]) -> Tuple[Optional[Dict], Optional[str]]:
+    async with session.get(url, headers=headers, params=params) as response:
+        if response.status != 200:
+            return None, f'{name} returned {response.status}'
+        return await response.json(), None
+
+
+async def fetch_json(session: aiohttp.ClientSession, name: str, url: str, timeout: float,
+                     headers: Optional[Dict] = None, params: Optional[Dict] = None) -> Tuple[Optional[Dict], Optional[str]]:
+    """GET a JSON document within `timeout` seconds, returning (data, None) or (None, error message)"""
+    try:
+        return await asyncio.wait_for(get_json(session, name, url, headers, params), timeout)
+    except asyncio.TimeoutError:
+        return None, f'{name} timed out after {timeout}s'
+    except (aiohttp.ClientError, ValueError) as e:
+        return None, f'{name} unavailable: {e}'
+
+
+async def fetch_products(session: aiohttp.ClientSession, product_ids: List) -> Tuple[Dict, Dict]:
+    """Look up products within PRODUCTS_TIMEOUT, returning (products, errors) keyed by str(id)"""
+    # Never have more lookups in flight than product-service connections in the pool
+    slots = asyncio.Semaphore(POOL_SIZE_PER_HOST)
+
+    async def fetch_product(product_id):
+        # The per-request deadline starts once a connection slot is ours
+        async with slots:
+            return await fetch_json(session, 'product-service',
+                                    f'{PRODUCT_SERVICE_URL}/products/{quote(str(product_id), safe="")}',
+                                    PRODUCT_TIMEOUT)
+
+    products: Dict = {str(product_id): None for product_id in product_ids}
+    errors: Dict = {}
+    if not product_ids:
+        return products, errors
+
+    tasks = {asyncio.ensure_future(fetch_product(product_id)): product_id for product_id in product_ids}
+    done, pending = await asyncio.wait(tasks, timeout=PRODUCTS_TIMEOUT)
+    for task in pending:
+        task.cancel()
+        errors[str(tasks[task])] = f'product-service lookups did not finish within {PRODUCTS_TIMEOUT}s'
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    for task in done:
+        product, error = task.result()
+        products[str(tasks[task])] = product
+        if error:
+            errors[str(tasks[task])] = error
+    return products, errors
+
+
+async def compose_account(session: aiohttp.ClientSession, token: str, customer_id: str) -> Dict:
+    """Fetch the user and their orders concurrently, then each distinct product once"""
+    (user, user_error), (order_data, orders_error) = await asyncio.gather(
+        fetch_json(session, 'auth-service', f'{AUTH_SERVICE_URL}/api/user', AUTH_TIMEOUT,
+                   headers={'Authorization': f'Bearer {token}'}),
+        fetch_json(session, 'order-service', f'{ORDER_SERVICE_URL}/orders', ORDER_TIMEOUT,
+                   params={'customer_id': customer_id})
+    )
+
+    errors: Dict = {}
+    if user_error:
+        errors['user'] = user_error
+    if orders_error:
+        errors['orders'] = orders_error
+
+    orders: List[Dict] = order_data['orders'] if order_data else []
+
+    # dict.fromkeys keeps first-seen order while dropping repeats across orders
+    product_ids = list(dict.fromkeys(
+        item['product_id'] for order in orders for item in order.get('items', [])
+    ))
+
+    products, product_errors = await fetch_products(session, product_ids)
+    if product_errors:
+        errors['products'] = product_errors
+
+    for order in orders:
+        for item in order.get('items', []):
+            item['product'] = products.get(str(item['product_id']))
+
+    return {
+        'user': user,
+        'customer_id': customer_id,
+        'orders': orders,
+        'order_count': len(orders),
+        'product_count': len(product_ids),
+        'errors': errors,
+        'partial': bool(errors)
+    }
+
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'message': 'Token is missing'}), 401
+
+        try:
+            if token.startswith('Bearer '):
+                token = token[7:]
+            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+            current_user = data['username']
+        except Exception:
+            return jsonify({'message': 'Token is invalid'}), 401
+
+        return f(current_user, token, *args, **kwargs)
+    return decorated
+
+
+# Health check endpoint
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'service': 'account-service'
+    })
+
+
+# Everything the storefront account page needs in one response
+@app.route('/account', methods=['GET'])
+@token_required
+def get_account(current_user, token):
+    # Only ever show the orders of the user the token was issued to
+    customer_id = current_user
+    try:
+        # Upstream calls enforce their own deadlines; this is only a backstop for a stuck loop
+        account = upstreams.run(compose_account, token, customer_id,
+                                timeout=max(AUTH_TIMEOUT, ORDER_TIMEOUT) + PRODUCTS_TIMEOUT + 1)
+    except Exception as e:
+        logger.error("Error composing account for %s: %s", current_user, e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+    if account['user'] is None and 'orders' in account['errors']:
+        logger.warning("All upstreams failed for account %s: %s", current_user, account['errors'])
+        return jsonify(account), 502
+
+    return jsonify(account), 200
+
+
+# Error handlers
+@app.errorhandler(404)
+def not_found(error):
+    return jsonify({'error': 'Endpoint not found'}), 404
+
+@app.errorhandler(500)
+def internal_error(error):
+    logger.error("Internal server error: %s", error)
+    return jsonify({'error': 'Internal server error'}), 500
+
+if __name__ == '__main__':
+    logger.info("Starting Account Service on port %s", PORT)
+    app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,185 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+import jwt
+import pytest
+from aiohttp import web
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(SERVICE_DIR))
+
+# Loaded under its own name so it cannot clash with the other services' app modules
+_spec = importlib.util.spec_from_file_location('account_service_app', os.path.join(SERVICE_DIR, 'app.py'))
+account_app = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = account_app
+_spec.loader.exec_module(account_app)
+
+
+class StubUpstreams:
+    """auth-service, order-service and product-service endpoints on one local server.
+
+    Set `user` or `orders` to None to make that upstream fail; products
+    missing from `products` return 404. `delays` holds per-product response
+    delays and `drip` product ids whose body is sent a byte at a time.
+    """
+
+    def __init__(self):
+        self.user = {'username': 'alice'}
+        self.orders = []
+        self.products = {}
+        self.delays = {}
+        self.drip = set()
+        self.order_queries = []
+        self.url = None
+
+    async def get_user(self, request):
+        if self.user is None:
+            return web.json_response({'error': 'down'}, status=500)
+        return web.json_response(self.user)
+
+    async def get_orders(self, request):
+        self.order_queries.append(dict(request.query))
+        if self.orders is None:
+            return web.json_response({'error': 'down'}, status=500)
+        return web.json_response({'orders': self.orders, 'count': len(self.orders)})
+
+    async def get_product(self, request):
+        product_id = request.match_info['product_id']
+        await asyncio.sleep(self.delays.get(product_id, 0))
+        if product_id not in self.products:
+            return web.json_response({'error': 'Product not found'}, status=404)
+        if product_id not in self.drip:
+            return web.json_response(self.products[product_id])
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        await response.prepare(request)
+        for byte in web.json_response(self.products[product_id]).body:
+            await response.write(bytes([byte]))
+            await asyncio.sleep(0.05)
+        return response
+
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    stub = StubUpstreams()
+    stub_app = web.Application()
+    stub_app.router.add_get('/api/user', stub.get_user)
+    stub_app.router.add_get('/orders', stub.get_orders)
+    stub_app.router.add_get('/products/{product_id}', stub.get_product)
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runner = web.AppRunner(stub_app)
+    asyncio.run_coroutine_threadsafe(runner.setup(), loop).result()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    asyncio.run_coroutine_threadsafe(site.start(), loop).result()
+    stub.url = 'http://{}:{}'.format(*runner.addresses[0][:2])
+
+    for name in ('AUTH_SERVICE_URL', 'ORDER_SERVICE_URL', 'PRODUCT_SERVICE_URL'):
+        monkeypatch.setattr(account_app, name, stub.url)
+    yield stub
+
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+@pytest.fixture
+def client():
+    return account_app.app.test_client()
+
+
+def auth_header(username='alice'):
+    token = jwt.encode({'username': username}, account_app.SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def order(*product_ids):
+    return {'id': f'order-{"-".join(map(str, product_ids))}',
+            'items': [{'product_id': product_id, 'quantity': 1} for product_id in product_ids]}
+
+
+def test_each_product_is_fetched_once(upstreams, client):
+    upstreams.orders = [order(1, 2), order(2, 3), order(1)]
+    upstreams.products = {str(i): {'id': i, 'name': f'Product {i}'} for i in (1, 2, 3)}
+
+    response = client.get('/account', headers=auth_header())
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert body['product_count'] == 3
+    assert body['partial'] is False and body['errors'] == {}
+    assert [[item['product']['id'] for item in o['items']] for o in body['orders']] == [[1, 2], [2, 3], [1]]
+
+
+def test_failed_product_gives_partial_response(upstreams, client):
+    upstreams.orders = [order(1, 2)]
+    upstreams.products = {'1': {'id': 1}}
+
+    response = client.get('/account', headers=auth_header())
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert body['partial'] is True
+    assert body['errors'] == {'products': {'2': 'product-service returned 404'}}
+    assert body['user'] == {'username': 'alice'}
+    assert [item['product'] for item in body['orders'][0]['items']] == [{'id': 1}, None]
+
+
+def test_slow_drip_product_misses_its_deadline(upstreams, client, monkeypatch):
+    monkeypatch.setattr(account_app, 'PRODUCT_TIMEOUT', 0.3)
+    upstreams.orders = [order(1, 2)]
+    upstreams.products = {'1': {'id': 1}, '2': {'id': 2, 'name': 'a long enough product name'}}
+    upstreams.drip = {'2'}
+
+    body = client.get('/account', headers=auth_header()).get_json()
+
+    assert body['errors'] == {'products': {'2': 'product-service timed out after 0.3s'}}
+
+
+def test_product_phase_budget_keeps_what_was_composed(upstreams, client, monkeypatch):
+    monkeypatch.setattr(account_app, 'POOL_SIZE_PER_HOST', 2)
+    monkeypatch.setattr(account_app, 'PRODUCTS_TIMEOUT', 0.5)
+    product_ids = list(range(1, 11))
+    upstreams.orders = [order(*product_ids)]
+    upstreams.products = {str(i): {'id': i} for i in product_ids}
+    upstreams.delays = {str(i): 0.2 for i in product_ids}
+
+    started = time.monotonic()
+    response = client.get('/account', headers=auth_header())
+    body = response.get_json()
+
+    # Two lookups at a time at 0.2s each: four finish before the budget runs out
+    assert time.monotonic() - started < 1.5
+    assert response.status_code == 200
+    assert body['partial'] is True and body['user'] == {'username': 'alice'}
+    assert sorted(body['errors']['products'], key=int) == [str(i) for i in range(5, 11)]
+    assert [item['product'] is not None for item in body['orders'][0]['items']] == [True] * 4 + [False] * 6
+
+
+def test_all_upstreams_failing_is_bad_gateway(upstreams, client):
+    upstreams.user = None
+    upstreams.orders = None
+
+    response = client.get('/account', headers=auth_header())
+
+    assert response.status_code == 502
+    assert set(response.get_json()['errors']) == {'user', 'orders'}
+
+
+def test_missing_or_invalid_token_is_rejected(upstreams, client):
+    assert client.get('/account').status_code == 401
+    assert client.get('/account', headers={'Authorization': 'Bearer not-a-token'}).status_code == 401
+    assert upstreams.order_queries == []
+
+
+def test_customer_id_comes_from_the_token(upstreams, client):
+    response = client.get('/account?customer_id=bob', headers=auth_header('alice'))
+
+    assert response.get_json()['customer_id'] == 'alice'
+    assert upstreams.order_queries == [{'customer_id': 'alice'}]
@@ -1,9 +1,5 @@
 from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for
 import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import jwt
@@ -12,8 +8,17 @@ import os
 from dataclasses import dataclass
 from typing import Dict, Optional
 
+from common.instrumentation import register_instrumentation
+from common.log_pipeline import configure_logging
+
+# Configure logging
+log_pipeline = configure_logging('auth-service', logger_names=[__name__])
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+metrics = register_instrumentation(app, 'auth-service')
+log_pipeline.register_metrics(metrics)
 
 # In-memory user storage (replace with database in production)
 users: Dict[str, dict] = {}
@@ -146,12 +151,12 @@ def home():
             return redirect(url_for('dashboard'))
         return redirect(url_for('login'))
     except Exception as e:
-        logger.error(f"Error in home route: {e}")
+        logger.error("Error in home route: %s", e)
         return f"Error: {e}", 500
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    logger.info(f"Login route accessed with method: {request.method}")
+    logger.info("Login route accessed with method: %s", request.method)
     try:
         if request.method == 'POST':
             username = request.form['username']
@@ -170,7 +175,7 @@ def login():
                                     title="Login", 
                                     button_text="Login")
     except Exception as e:
-        logger.error(f"Error in login route: {e}")
+        logger.error("Error in login route: %s", e)
         return f"Error: {e}", 500
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -298,7 +303,7 @@ if __name__ == '__main__':
         }
     
     logger.info("Starting Flask application...")
-    logger.info(f"Available routes: {[rule.rule for rule in app.url_map.iter_rules()]}")
+    logger.info("Available routes: %s", [rule.rule for rule in app.url_map.iter_rules()])
     
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,59 @@
+"""Compare two benchmark result files.
+
+    python -m benchmarks.compare base.json head.json [--threshold 10]
+
+Prints throughput and p50/p99 changes for every workload and scenario both
+runs measured. With --threshold, exits non-zero if any p99 latency grew or
+throughput dropped by more than that many percent.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+
+def rows(report: Dict) -> Iterator[Tuple[str, Dict]]:
+    for mode, workloads in sorted(report['results'].items()):
+        for workload, summary in sorted(workloads.items()):
+            yield f'{mode}/{workload}', summary
+            for scenario, scenario_summary in sorted(summary['scenarios'].items()):
+                yield f'{mode}/{workload}/{scenario}', scenario_summary
+
+
+def change(base: float, head: float) -> float:
+    if not base:
+        return 0.0
+    return (head - base) / base * 100
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, help='fail on regressions larger than this percentage')
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = dict(rows(json.load(f)))
+    with open(args.head) as f:
+        head = dict(rows(json.load(f)))
+
+    print(f"{'benchmark':<45} {'req/s':>18} {'p50 ms':>20} {'p99 ms':>20}")
+    regressions = []
+    for name in sorted(base.keys() & head.keys()):
+        b, h = base[name], head[name]
+        throughput = change(b['throughput_rps'], h['throughput_rps'])
+        p50 = change(b['p50_ms'], h['p50_ms'])
+        p99 = change(b['p99_ms'], h['p99_ms'])
+        print(f"{name:<45} {h['throughput_rps']:>10.1f} {throughput:>+6.1f}% "
+              f"{h['p50_ms']:>12.3f} {p50:>+6.1f}% {h['p99_ms']:>12.3f} {p99:>+6.1f}%")
+        if args.threshold is not None and (p99 > args.threshold or -throughput > args.threshold):
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
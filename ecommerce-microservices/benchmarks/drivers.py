@@ -0,0 +1,66 @@
+"""Ways of sending benchmark requests to the services.
+
+Both drivers keep per-thread clients so load generator threads never share
+a connection.
+"""
+import http.client
+import json
+import threading
+from typing import Dict
+
+from benchmarks.workloads import Request
+
+
+class InProcessDriver:
+    """Calls the Flask apps directly through their test clients"""
+
+    def __init__(self, apps: Dict):
+        self.apps = apps
+        self._local = threading.local()
+
+    def send(self, req: Request) -> int:
+        clients = getattr(self._local, 'clients', None)
+        if clients is None:
+            clients = self._local.clients = {name: app.test_client() for name, app in self.apps.items()}
+
+        response = clients[req.service].open(req.path, method=req.method, json=req.json, headers=req.headers)
+        response.get_data()
+        return response.status_code
+
+
+class HttpDriver:
+    """Sends requests over HTTP to services running on local ports"""
+
+    def __init__(self, ports: Dict[str, int], host: str = '127.0.0.1', timeout: float = 300):
+        self.ports = ports
+        self.host = host
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, service: str) -> http.client.HTTPConnection:
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(service)
+        if conn is None:
+            conn = connections[service] = http.client.HTTPConnection(
+                self.host, self.ports[service], timeout=self.timeout)
+        return conn
+
+    def send(self, req: Request) -> int:
+        headers = dict(req.headers or {})
+        body = None
+        if req.json is not None:
+            body = json.dumps(req.json)
+            headers['Content-Type'] = 'application/json'
+
+        conn = self._connection(req.service)
+        try:
+            conn.request(req.method, req.path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            # Drop the connection so the next request reconnects
+            conn.close()
+            raise
@@ -0,0 +1,19 @@
+"""Gunicorn config the benchmark passes with -c to seed each worker.
+
+Product and user data live in per-worker memory, so every worker seeds the
+same deterministic data set once it has loaded the app. Orders are already
+in the shared SQLite store and are left alone. The `benchmarks` package is
+importable because the runner puts its parent directory on PYTHONPATH.
+"""
+import os
+import sys
+
+
+def post_worker_init(worker):
+    from benchmarks.seed import seed_products, seed_users
+
+    module = sys.modules['app']
+    if 'BENCH_USERS' in os.environ and hasattr(module, 'users'):
+        seed_users(module, int(os.environ['BENCH_USERS']))
+    if 'BENCH_PRODUCTS' in os.environ and hasattr(module, 'products'):
+        seed_products(module, int(os.environ['BENCH_PRODUCTS']), seed=int(os.environ.get('BENCH_SEED', 0)))
@@ -0,0 +1,292 @@
+"""Throughput and latency benchmarks for the auth, product and order services.
+
+Run from the ecommerce-microservices directory:
+
+    python -m benchmarks.run --mode both --output results.json
+    python -m benchmarks.run --scale 0.01 --duration 10 --workload mixed
+
+`inprocess` mode drives the Flask apps through their test clients;
+`server` mode launches them as their Dockerfiles do (gunicorn for product
+and order, the development server for auth) on local ports and drives them
+over HTTP. Both modes seed the same deterministic data: 1M orders, 500k
+products and 100k users at --scale 1.
+
+Results are JSON with throughput and p50/p90/p99 latency per workload and
+scenario; compare two runs with `python -m benchmarks.compare`. Warmup only
+runs before each workload, so cold start is reported on its own under
+`cold_start`: seconds until each service is up and the latency of the first
+request of each scenario.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from typing import Dict, List, Tuple
+
+from benchmarks.drivers import HttpDriver, InProcessDriver
+from benchmarks.seed import (BENCHMARK_PASSWORD, DEFAULT_ANCHOR, seed_orders, seed_products, seed_users,
+                             username)
+from benchmarks.services import ROOT, load_app, start_servers, stop_servers
+from benchmarks.workloads import SCENARIOS, WORKLOADS, Context
+
+DEFAULT_SIZES = {'orders': 1000000, 'products': 500000, 'users': 100000}
+DEFAULT_PORTS = {'auth': 15000, 'product': 15001, 'order': 15002}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarise(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0
+    }
+
+
+def drive(driver, ctx: Context, weights: Dict[str, int], duration: float,
+          concurrency: int, seed: int) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    """Send a weighted mix of requests from `concurrency` threads for `duration` seconds"""
+    names = list(weights)
+    cumulative = []
+    total = 0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        local_latencies = {name: [] for name in names}
+        local_errors = {name: 0 for name in names}
+
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, cum_weights=cumulative)[0]
+            req = SCENARIOS[name](ctx, rng)
+            started = time.perf_counter()
+            try:
+                ok = driver.send(req) < 400
+            except Exception:
+                ok = False
+            local_latencies[name].append(time.perf_counter() - started)
+            if not ok:
+                local_errors[name] += 1
+
+        with lock:
+            for name in names:
+                latencies[name].extend(local_latencies[name])
+                errors[name] += local_errors[name]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def run_workloads(driver, ctx: Context, args) -> Dict:
+    results = {}
+    for workload in args.workload:
+        weights = WORKLOADS[workload]
+        if args.warmup:
+            drive(driver, ctx, weights, args.warmup, args.concurrency, args.seed)
+
+        latencies, errors, elapsed = drive(driver, ctx, weights, args.duration, args.concurrency, args.seed)
+        all_latencies = [value for values in latencies.values() for value in values]
+        results[workload] = {
+            **summarise(all_latencies, sum(errors.values()), elapsed),
+            'scenarios': {
+                name: summarise(latencies[name], errors[name], elapsed) for name in weights
+            }
+        }
+        print(f"  {workload}: {results[workload]['throughput_rps']} req/s, "
+              f"p50 {results[workload]['p50_ms']}ms, p99 {results[workload]['p99_ms']}ms",
+              file=sys.stderr)
+    return results
+
+
+def measure_first_requests(driver, ctx: Context, args) -> Dict[str, float]:
+    """Latency in ms of one request per scenario, sent before any warmup"""
+    rng = random.Random(args.seed)
+    scenarios = dict.fromkeys(name for workload in args.workload for name in WORKLOADS[workload])
+    first_requests = {}
+    for name in scenarios:
+        req = SCENARIOS[name](ctx, rng)
+        started = time.perf_counter()
+        try:
+            driver.send(req)
+        except Exception:
+            pass
+        first_requests[name] = round((time.perf_counter() - started) * 1000, 3)
+    return first_requests
+
+
+def fetch_token(driver) -> str:
+    # Drivers only return status codes, so log in through the app directly when possible
+    if isinstance(driver, InProcessDriver):
+        response = driver.apps['auth'].test_client().post(
+            '/api/login', json={'username': username(0), 'password': BENCHMARK_PASSWORD})
+        return response.get_json()['token']
+
+    conn = http.client.HTTPConnection('127.0.0.1', driver.ports['auth'], timeout=60)
+    conn.request('POST', '/api/login', body=json.dumps({'username': username(0), 'password': BENCHMARK_PASSWORD}),
+                 headers={'Content-Type': 'application/json'})
+    return json.loads(conn.getresponse().read())['token']
+
+
+def run_inprocess(sizes: Dict[str, int], workdir: str, args) -> Tuple[Dict, Dict]:
+    os.environ['ORDER_DB_PATH'] = os.path.join(workdir, 'inprocess-orders.db')
+    os.environ['METRICS_DIR'] = os.path.join(workdir, 'inprocess-metrics')
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+
+    print('Seeding in-process apps...', file=sys.stderr)
+    modules = {}
+    startup = {}
+    for service in ('auth', 'product', 'order'):
+        started = time.perf_counter()
+        modules[service] = load_app(service)
+        startup[service] = round(time.perf_counter() - started, 3)
+    seed_users(modules['auth'], sizes['users'])
+    seed_products(modules['product'], sizes['products'], seed=args.seed)
+    seed_orders(modules['order'].orders, modules['order'].Order.from_dict, sizes['orders'],
+                sizes['products'], sizes['users'], seed=args.seed, anchor=args.anchor)
+
+    driver = InProcessDriver({service: module.app for service, module in modules.items()})
+    ctx = Context(users=sizes['users'], products=sizes['products'], orders=sizes['orders'])
+    ctx.token = fetch_token(driver)
+    cold_start = {'startup_s': startup, 'first_request_ms': measure_first_requests(driver, ctx, args)}
+
+    print('Running in-process workloads...', file=sys.stderr)
+    return run_workloads(driver, ctx, args), cold_start
+
+
+def run_server(sizes: Dict[str, int], workdir: str, args) -> Tuple[Dict, Dict]:
+    # The order store and its rollups are shared through SQLite, so seed them once up front
+    sys.path.insert(0, os.path.join(ROOT, 'order-service'))
+    from rollups import OrderRollups
+    from store import OrderStore
+
+    db_path = os.path.join(workdir, 'server-orders.db')
+    print('Seeding order database...', file=sys.stderr)
+    store = OrderStore(db_path, load=lambda data: types.SimpleNamespace(**data), dump=vars)
+    OrderRollups(store)
+    seed_orders(store, lambda data: types.SimpleNamespace(**data), sizes['orders'],
+                sizes['products'], sizes['users'], seed=args.seed, anchor=args.anchor)
+    del store
+
+    metrics_dir = os.path.join(workdir, 'server-metrics')
+    os.makedirs(metrics_dir, exist_ok=True)
+    env = {
+        'ORDER_DB_PATH': db_path,
+        'METRICS_DIR': metrics_dir,
+        'BENCH_USERS': str(sizes['users']),
+        'BENCH_PRODUCTS': str(sizes['products']),
+        'BENCH_SEED': str(args.seed)
+    }
+    print('Starting servers...', file=sys.stderr)
+    processes, startup = start_servers(DEFAULT_PORTS, env, workdir)
+    try:
+        driver = HttpDriver(DEFAULT_PORTS)
+        ctx = Context(users=sizes['users'], products=sizes['products'], orders=sizes['orders'])
+        ctx.token = fetch_token(driver)
+        cold_start = {'startup_s': startup, 'first_request_ms': measure_first_requests(driver, ctx, args)}
+
+        print('Running server workloads...', file=sys.stderr)
+        return run_workloads(driver, ctx, args), cold_start
+    finally:
+        stop_servers(processes)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the e-commerce microservices')
+    parser.add_argument('--mode', choices=['inprocess', 'server', 'both'], default='both')
+    parser.add_argument('--workload', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--duration', type=float, default=30, help='seconds to measure each workload')
+    parser.add_argument('--warmup', type=float, default=5,
+                        help='unmeasured seconds before each workload (cold start is reported separately)')
+    parser.add_argument('--concurrency', type=int, default=8, help='load generator threads')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier on the default data volumes')
+    parser.add_argument('--orders', type=int)
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--anchor', type=datetime.datetime.fromisoformat, default=DEFAULT_ANCHOR,
+                        help='naive UTC time generated orders count back from (ISO 8601)')
+    parser.add_argument('--workdir', help='where databases and server logs go (default: a temp dir)')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    sizes = {
+        name: getattr(args, name) if getattr(args, name) is not None else max(1, int(default * args.scale))
+        for name, default in DEFAULT_SIZES.items()
+    }
+    workdir = args.workdir or tempfile.mkdtemp(prefix='ecommerce-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    modes = ['inprocess', 'server'] if args.mode == 'both' else [args.mode]
+    results = {}
+    cold_start = {}
+    for mode in modes:
+        runner = run_inprocess if mode == 'inprocess' else run_server
+        results[mode], cold_start[mode] = runner(sizes, workdir, args)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sizes': sizes,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'anchor': args.anchor.isoformat()
+        },
+        'cold_start': cold_start,
+        'results': results
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Deterministic data sets for the benchmark suite.
+
+The same seed always produces the same users, products and orders, so runs
+on different commits are measured against identical data. Order timestamps
+count back from a fixed anchor rather than the current time for the same
+reason.
+"""
+import datetime
+import random
+import uuid
+from typing import Callable, Dict, Iterator
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+CATEGORIES = ['Electronics', 'Education', 'Kitchen', 'Garden', 'Sports', 'Toys', 'Clothing', 'Books']
+CITIES = [
+    ('New York', 'NY', '10001'),
+    ('Los Angeles', 'CA', '90210'),
+    ('Chicago', 'IL', '60601'),
+    ('Houston', 'TX', '77001'),
+    ('Seattle', 'WA', '98101')
+]
+PAYMENT_METHODS = ['credit_card', 'debit_card', 'paypal']
+
+# Orders are spread over the days before this instant (naive UTC)
+DEFAULT_ANCHOR = datetime.datetime(2026, 1, 1)
+
+# Rough status mix of a live store: most orders are finished
+STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+STATUS_WEIGHTS = [5, 5, 15, 70, 5]
+
+
+def username(index: int) -> str:
+    return f'user{index:06d}'
+
+
+def customer_id(index: int) -> str:
+    return f'customer_{index:06d}'
+
+
+def order_id(index: int) -> str:
+    return str(uuid.UUID(int=index + 1))
+
+
+def product_price(rng: random.Random) -> float:
+    return round(rng.uniform(1, 500), 2)
+
+
+def seed_users(module, count: int):
+    """Fill auth-service's user table; every user shares BENCHMARK_PASSWORD"""
+    # Hashing is deliberately slow, so hash once and share it
+    password_hash = module.generate_password_hash(BENCHMARK_PASSWORD)
+    module.users.update({
+        username(i): {'password': password_hash, 'email': f'{username(i)}@example.com'}
+        for i in range(count)
+    })
+
+
+def seed_products(module, count: int, seed: int = 0):
+    """Replace product-service's catalogue with `count` products"""
+    rng = random.Random(seed)
+    module.products[:] = [
+        {
+            'id': i,
+            'name': f'Product {i}',
+            'price': product_price(rng),
+            'category': rng.choice(CATEGORIES)
+        }
+        for i in range(1, count + 1)
+    ]
+    module.next_id = count + 1
+
+
+def order_items(rng: random.Random, product_count: int):
+    items = []
+    for _ in range(rng.randint(1, 4)):
+        product_id = rng.randint(1, product_count)
+        items.append({
+            'product_id': product_id,
+            'name': f'Product {product_id}',
+            'price': product_price(rng),
+            'quantity': rng.randint(1, 3)
+        })
+    return items
+
+
+def shipping_address(rng: random.Random) -> Dict:
+    city, state, zip_code = rng.choice(CITIES)
+    return {
+        'street': f'{rng.randint(1, 9999)} Main St',
+        'city': city,
+        'state': state,
+        'zip_code': zip_code,
+        'country': 'USA'
+    }
+
+
+def generate_orders(count: int, product_count: int, user_count: int, seed: int = 0,
+                    days: int = 30, anchor: datetime.datetime = DEFAULT_ANCHOR) -> Iterator[Dict]:
+    """Yield order dicts (in Order.to_dict form) spread over the `days` days before `anchor`"""
+    rng = random.Random(seed)
+
+    for i in range(count):
+        items = order_items(rng, product_count)
+        created_at = (anchor - datetime.timedelta(seconds=rng.uniform(0, days * 86400))).isoformat()
+        yield {
+            'id': order_id(i),
+            'customer_id': customer_id(rng.randrange(user_count)),
+            'items': items,
+            'shipping_address': shipping_address(rng),
+            'payment_method': rng.choice(PAYMENT_METHODS),
+            'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+            'total_amount': sum(item['price'] * item['quantity'] for item in items),
+            'created_at': created_at,
+            'updated_at': created_at
+        }
+
+
+def seed_orders(store, make_order: Callable[[Dict], object], count: int, product_count: int,
+                user_count: int, seed: int = 0, anchor: datetime.datetime = DEFAULT_ANCHOR,
+                batch_size: int = 10000):
+    """Bulk load generated orders into an order-service OrderStore"""
+    batch = []
+    for data in generate_orders(count, product_count, user_count, seed=seed, anchor=anchor):
+        batch.append(make_order(data))
+        if len(batch) >= batch_size:
+            store.save_many(batch)
+            batch = []
+    if batch:
+        store.save_many(batch)
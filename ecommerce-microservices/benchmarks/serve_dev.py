@@ -0,0 +1,29 @@
+"""Run a service the way `python app.py` does, after seeding its in-memory data.
+
+Usage: python benchmarks/serve_dev.py <service> <port>
+
+Seed sizes come from the BENCH_USERS, BENCH_PRODUCTS and BENCH_SEED
+environment variables set by the benchmark runner, which also puts the
+ecommerce-microservices directory on PYTHONPATH.
+"""
+import os
+import sys
+
+from benchmarks.seed import seed_products, seed_users
+from benchmarks.services import load_app
+
+
+def main():
+    service, port = sys.argv[1], int(sys.argv[2])
+    module = load_app(service, module_name='app')
+
+    if 'BENCH_USERS' in os.environ and hasattr(module, 'users'):
+        seed_users(module, int(os.environ['BENCH_USERS']))
+    if 'BENCH_PRODUCTS' in os.environ and hasattr(module, 'products'):
+        seed_products(module, int(os.environ['BENCH_PRODUCTS']), seed=int(os.environ.get('BENCH_SEED', 0)))
+
+    module.app.run(host='127.0.0.1', port=port, debug=False)
+
+
+if __name__ == '__main__':
+    main()
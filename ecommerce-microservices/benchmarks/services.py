@@ -0,0 +1,108 @@
+"""Loading the service apps in-process and launching them as servers"""
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOOKS = os.path.join(ROOT, 'benchmarks', 'gunicorn_hooks.py')
+
+SERVICE_DIRS = {
+    'auth': 'auth-service',
+    'product': 'product-service',
+    'order': 'order-service'
+}
+
+
+def load_app(service: str, module_name: str = None):
+    """Import a service's app.py under a unique module name"""
+    directory = os.path.join(ROOT, SERVICE_DIRS[service])
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    spec = importlib.util.spec_from_file_location(
+        module_name or f'{service}_service_app', os.path.join(directory, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def python_path() -> str:
+    """PYTHONPATH for service processes, so they can import `common` and `benchmarks`"""
+    existing = os.environ.get('PYTHONPATH')
+    return os.pathsep.join([ROOT, existing]) if existing else ROOT
+
+
+def server_command(service: str, port: int) -> List[str]:
+    """The command each Dockerfile runs, bound to a local port"""
+    bind = f'127.0.0.1:{port}'
+    if service == 'auth':
+        # CMD ["python", "app.py"], with users seeded first
+        return [sys.executable, os.path.join(ROOT, 'benchmarks', 'serve_dev.py'), service, str(port)]
+    if service == 'product':
+        return [sys.executable, '-m', 'gunicorn', '--bind', bind, '--workers', '4', '--timeout', '30',
+                '-c', HOOKS, 'app:app']
+    if service == 'order':
+        return [sys.executable, '-m', 'gunicorn', '--bind', bind, '--workers', '4', '--timeout', '120',
+                '--keep-alive', '2', '--max-requests', '1000', '--max-requests-jitter', '100',
+                '-c', HOOKS, 'app:app']
+    raise ValueError(f'Unknown service: {service}')
+
+
+def start_servers(ports: Dict[str, int], env: Dict[str, str], log_dir: str,
+                  startup_timeout: float = 600) -> Tuple[Dict[str, subprocess.Popen], Dict[str, float]]:
+    """Launch every service and wait until each answers /health.
+
+    Returns the processes and, per service, the seconds from launch until
+    its first healthy response.
+    """
+    processes = {}
+    startup = {}
+    launched = time.monotonic()
+    for service, port in ports.items():
+        log = open(os.path.join(log_dir, f'{service}.log'), 'wb')
+        processes[service] = subprocess.Popen(
+            server_command(service, port),
+            cwd=os.path.join(ROOT, SERVICE_DIRS[service]),
+            env={**os.environ, **env, 'PORT': str(port), 'PYTHONPATH': python_path()},
+            stdout=log,
+            stderr=subprocess.STDOUT
+        )
+
+    # Poll every service in turn so each startup time is measured independently
+    deadline = launched + startup_timeout
+    pending = dict(ports)
+    while pending:
+        for service, port in list(pending.items()):
+            if processes[service].poll() is not None:
+                stop_servers(processes)
+                raise RuntimeError(f'{service} exited during startup, see {log_dir}/{service}.log')
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=5)
+            except OSError:
+                continue
+            startup[service] = round(time.monotonic() - launched, 3)
+            del pending[service]
+
+        if pending:
+            if time.monotonic() > deadline:
+                stop_servers(processes)
+                raise RuntimeError(f'{", ".join(pending)} did not become healthy')
+            time.sleep(0.5)
+
+    return processes, startup
+
+
+def stop_servers(processes: Dict[str, subprocess.Popen]):
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    for process in processes.values():
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
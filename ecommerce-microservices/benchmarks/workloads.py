@@ -0,0 +1,76 @@
+"""Request scenarios and the weighted mixes that make up each workload"""
+import random
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from benchmarks.seed import BENCHMARK_PASSWORD, customer_id, order_items, shipping_address, username
+
+
+@dataclass
+class Request:
+    service: str
+    method: str
+    path: str
+    json: Optional[Dict] = None
+    headers: Optional[Dict] = None
+
+
+@dataclass
+class Context:
+    """Seeded data sizes plus anything fetched during setup"""
+    users: int
+    products: int
+    orders: int
+    token: Optional[str] = None
+
+
+def login(ctx: Context, rng: random.Random) -> Request:
+    return Request('auth', 'POST', '/api/login', json={
+        'username': username(rng.randrange(ctx.users)),
+        'password': BENCHMARK_PASSWORD
+    })
+
+
+def token_read(ctx: Context, rng: random.Random) -> Request:
+    return Request('auth', 'GET', '/api/user', headers={'Authorization': f'Bearer {ctx.token}'})
+
+
+def browse_product(ctx: Context, rng: random.Random) -> Request:
+    return Request('product', 'GET', f'/products/{rng.randint(1, ctx.products)}')
+
+
+def list_products(ctx: Context, rng: random.Random) -> Request:
+    return Request('product', 'GET', '/products')
+
+
+def create_order(ctx: Context, rng: random.Random) -> Request:
+    return Request('order', 'POST', '/orders', json={
+        'customer_id': customer_id(rng.randrange(ctx.users)),
+        'items': order_items(rng, ctx.products),
+        'shipping_address': shipping_address(rng),
+        'payment_method': 'credit_card'
+    })
+
+
+def poll_stats(ctx: Context, rng: random.Random) -> Request:
+    return Request('order', 'GET', '/orders/stats')
+
+
+SCENARIOS = {
+    'login': login,
+    'token_read': token_read,
+    'browse_product': browse_product,
+    'list_products': list_products,
+    'create_order': create_order,
+    'poll_stats': poll_stats
+}
+
+# Workload name -> scenario weights
+WORKLOADS = {
+    'login_burst': {'login': 1},
+    'token_reads': {'token_read': 1},
+    'catalogue': {'browse_product': 99, 'list_products': 1},
+    'order_create': {'create_order': 1},
+    'stats_polling': {'poll_stats': 1},
+    'mixed': {'login': 2, 'token_read': 30, 'browse_product': 40, 'create_order': 20, 'poll_stats': 8}
+}
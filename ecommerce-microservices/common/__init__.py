@@ -0,0 +1,13 @@
+"""Modules shared by the services: logging, metrics and instrumentation.
+
+The services import them as `common.<module>`, so the directory holding
+`common/` must be on PYTHONPATH:
+
+- Docker images are built from the ecommerce-microservices directory, so
+  `common/` is in the build context (`docker build -f order-service/Dockerfile .`).
+  It is copied to /app/common and the Dockerfiles set PYTHONPATH=/app.
+- Locally, run a service from its own directory with `PYTHONPATH=..`,
+  e.g. `cd order-service && PYTHONPATH=.. python app.py`.
+- The benchmarks run from the ecommerce-microservices directory
+  (`python -m benchmarks.run`) and set PYTHONPATH for the servers they start.
+"""
@@ -0,0 +1,279 @@
+"""Non-blocking structured logging shared by the services.
+
+`configure_logging(service_name)` replaces the root handlers with a bounded
+queue. Request threads only run the rate limit/sampling filter and enqueue
+the record; a background listener thread formats each record as one JSON
+line and writes it to stderr. Messages should use %-style arguments
+(`logger.info("Order %s created", order_id)`) so that formatting also
+happens on the listener thread.
+
+When the queue is full, or a logger is over its rate limit or sampled out,
+records are dropped and counted instead of blocking the caller. Records at
+ERROR and above are never rate limited or sampled.
+
+Each record's `service` field comes from the service that registered its
+logger (or a parent logger), so several apps can share one process.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Attributes present on every LogRecord; anything else was passed via `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects.
+
+    `services` maps logger names to the service their records belong to;
+    records from unmapped loggers belong to `service_name`.
+    """
+
+    def __init__(self, service_name: str, services: Optional[Dict[str, str]] = None):
+        super().__init__()
+        self.service_name = service_name
+        self.services: Dict[str, str] = services if services is not None else {}
+
+    def service_for(self, logger_name: str) -> str:
+        name = logger_name
+        while name:
+            service = self.services.get(name)
+            if service is not None:
+                return service
+            name = name.rpartition('.')[0]
+        return self.service_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'service': self.service_for(record.name),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Per-logger token bucket rate limiting and random sampling.
+
+    Counters are updated without a lock, so limits are approximate under
+    heavy thread contention; that is preferable to serialising every call.
+    """
+
+    def __init__(self, rate: float, burst: float, sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample_rates = sample_rates or {}
+        self.rate_limited = 0
+        self.sampled_out = 0
+        # logger name -> [tokens, last refill time]
+        self._buckets: Dict[str, List[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+
+        sample_rate = self.sample_rates.get(record.name)
+        if sample_rate is not None and random.random() >= sample_rate:
+            self.sampled_out += 1
+            return False
+
+        now = time.monotonic()
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            bucket = self._buckets[record.name] = [self.burst, now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            self.rate_limited += 1
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks or formats on the calling thread"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock implementation formats the message here; leave it to the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """The queue, filter and listener thread installed by `configure_logging`.
+
+    The listener is stopped with an event rather than a sentinel record, so
+    stopping never has to put anything on a full queue; it writes out what
+    is already queued and exits.
+    """
+
+    # How often an idle listener checks whether it has been asked to stop
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, service_name: str, queue_size: int, rate: float, burst: float,
+                 sample_rates: Optional[Dict[str, float]] = None, stream=None):
+        self.service_name = service_name
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.rate_filter = RateLimitFilter(rate, burst, sample_rates)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.handler.addFilter(self.rate_filter)
+
+        self.formatter = JsonFormatter(service_name)
+        self.output = logging.StreamHandler(stream or sys.stderr)
+        self.output.setFormatter(self.formatter)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_service(self, service_name: str, logger_names: Iterable[str] = (),
+                    sample_rates: Optional[Dict[str, float]] = None):
+        """Attribute records from `logger_names` (and their children) to `service_name`"""
+        for logger_name in logger_names:
+            self.formatter.services[logger_name] = service_name
+        self.rate_filter.sample_rates.update(sample_rates or {})
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._listen, args=(self.queue, self._stopping),
+                                            name='log-pipeline', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Write out queued records and stop the listener; safe to call repeatedly"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+
+    def _listen(self, log_queue: queue.Queue, stopping: threading.Event):
+        while True:
+            try:
+                record = log_queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                if stopping.is_set():
+                    return
+                continue
+            self.output.handle(record)
+
+    def _after_fork(self):
+        # The listener thread does not survive fork() and the queue's and
+        # handler's locks may have been held by it, so give each child fresh ones
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.handler.queue = self.queue
+        self.output.createLock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.start()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'enqueued': self.handler.enqueued,
+            'dropped_queue_full': self.handler.dropped,
+            'dropped_rate_limited': self.rate_filter.rate_limited,
+            'dropped_sampled': self.rate_filter.sampled_out,
+            'queue_depth': self.queue.qsize()
+        }
+
+    def register_metrics(self, metrics):
+        """Expose the pipeline's counters and queue depth through an instrumentation.Metrics"""
+        metrics.add_counter('log_records_enqueued_total', 'Log records accepted onto the queue',
+                            lambda: {'': self.handler.enqueued})
+        metrics.add_counter('log_records_dropped_total', 'Log records dropped before being written',
+                            lambda: {
+                                'reason="queue_full"': self.handler.dropped,
+                                'reason="rate_limited"': self.rate_filter.rate_limited,
+                                'reason="sampled"': self.rate_filter.sampled_out
+                            })
+        metrics.add_gauge('log_queue_depth', 'Log records waiting to be written',
+                          lambda: {'': self.queue.qsize()})
+
+
+_pipeline: Optional[LogPipeline] = None
+_configure_lock = threading.Lock()
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse "logger=rate,logger=rate" as used by LOG_SAMPLE_RATES"""
+    rates = {}
+    for entry in value.split(','):
+        if not entry.strip():
+            continue
+        logger_name, _, rate = entry.partition('=')
+        if not rate:
+            raise ValueError(f'Invalid log sample rate: {entry!r}')
+        rates[logger_name.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(service_name: str, level: int = logging.INFO,
+                      sample_rates: Optional[Dict[str, float]] = None,
+                      logger_names: Iterable[str] = ()) -> LogPipeline:
+    """Route all logging for this process through a non-blocking JSON pipeline.
+
+    Queue size and the per-logger rate limit (records per second, with a
+    burst of twice that) come from LOG_QUEUE_SIZE and LOG_RATE_LIMIT.
+    `sample_rates` maps logger names to the fraction of records to keep;
+    LOG_SAMPLE_RATES ("logger=rate,...") adds to and overrides it.
+
+    A process has one pipeline, set up by the first call. Every call
+    attributes records from `logger_names` to its `service_name`; records
+    from other loggers carry the first call's service name.
+    """
+    global _pipeline
+    sample_rates = {**(sample_rates or {}), **parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))}
+    with _configure_lock:
+        if _pipeline is None:
+            _pipeline = _install(service_name, level)
+        _pipeline.add_service(service_name, logger_names, sample_rates)
+        return _pipeline
+
+
+def _install(service_name: str, level: int) -> LogPipeline:
+    queue_size = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    rate = float(os.environ.get('LOG_RATE_LIMIT', 1000))
+    pipeline = LogPipeline(service_name, queue_size, rate, rate * 2)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(pipeline.handler)
+    root.setLevel(level)
+
+    pipeline.start()
+    os.register_at_fork(after_in_child=pipeline._after_fork)
+    atexit.register(pipeline.stop)
+    return pipeline
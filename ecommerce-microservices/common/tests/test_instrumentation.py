@@ -0,0 +1,111 @@
+import re
+
+import pytest
+from flask import Flask
+
+from common.instrumentation import LATENCY_BUCKETS, UNMATCHED_ROUTE, Metrics, register_instrumentation
+
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+
+
+def samples(text):
+    """Map (metric name, label string without the service label) to value"""
+    values = {}
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            labels = ','.join(label for label in labels.split(',') if not label.startswith('service='))
+            values[(name, labels)] = float(value)
+    return values
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask('test')
+
+    @app.route('/items/<item_id>', methods=['GET'])
+    def get_item(item_id):
+        return {'id': item_id}
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    app.metrics = register_instrumentation(app, 'test-service', metrics_dir=str(tmp_path))
+    return app
+
+
+def scrape(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    return samples(response.get_data(as_text=True))
+
+
+def test_histogram_and_counters(app):
+    client = app.test_client()
+    for i in range(3):
+        assert client.get(f'/items/{i}').status_code == 200
+
+    values = scrape(client)
+    labels = 'method="GET",route="/items/<item_id>"'
+    buckets = [values[('http_request_duration_seconds_bucket', f'{labels},le="{bound}"')]
+               for bound in LATENCY_BUCKETS]
+    assert buckets == sorted(buckets)
+    assert values[('http_request_duration_seconds_bucket', f'{labels},le="+Inf"')] == 3
+    assert values[('http_request_duration_seconds_count', labels)] == 3
+    assert values[('http_request_duration_seconds_sum', labels)] > 0
+    assert values[('http_requests_total', f'{labels},status="200"')] == 3
+    assert values[('http_request_errors_total', labels)] == 0
+    assert values[('http_requests_in_flight', '')] == 0
+
+
+def test_unmatched_routes_share_one_label(app):
+    client = app.test_client()
+    assert client.get('/missing').status_code == 404
+    assert client.get('/other/missing').status_code == 404
+    assert client.post('/items/1').status_code == 405
+
+    values = scrape(client)
+    assert values[('http_requests_total', f'method="GET",route="{UNMATCHED_ROUTE}",status="404"')] == 2
+    assert values[('http_requests_total', f'method="POST",route="{UNMATCHED_ROUTE}",status="405"')] == 1
+    assert not any('/missing' in labels for _, labels in values)
+
+
+def test_unhandled_exception_counts_as_server_error(app):
+    client = app.test_client()
+    assert client.get('/boom').status_code == 500
+
+    values = scrape(client)
+    assert values[('http_requests_total', 'method="GET",route="/boom",status="500"')] == 1
+    assert values[('http_request_errors_total', 'method="GET",route="/boom"')] == 1
+
+
+def test_metrics_endpoint_does_not_count_itself(app):
+    client = app.test_client()
+    scrape(client)
+    values = scrape(client)
+
+    assert not any('/metrics' in labels for _, labels in values)
+
+
+def test_workers_sharing_a_file_report_combined_totals(tmp_path):
+    path = str(tmp_path / 'shared-metrics.db')
+    workers = [Metrics('test-service', path), Metrics('test-service', path)]
+    dropped = [0, 1]
+    for index, metrics in enumerate(workers):
+        metrics.add_counter('things_dropped_total', 'Things dropped',
+                            lambda index=index: {'reason="full"': dropped[index]})
+
+    for count, metrics in zip((2, 3), workers):
+        for _ in range(count):
+            metrics.finish_request('GET', '/items', 200, metrics.start_request())
+    dropped[0] = 4
+    workers[0].flush()
+    dropped[0] = 6
+    workers[0].flush()
+
+    values = samples(workers[1].render())
+    assert values[('http_requests_total', 'method="GET",route="/items",status="200"')] == 5
+    # Only increases since a worker's last flush are added
+    assert values[('things_dropped_total', 'reason="full"')] == 7
@@ -0,0 +1,97 @@
+import io
+import json
+import logging
+
+import pytest
+
+from common.log_pipeline import LogPipeline, parse_sample_rates
+
+
+@pytest.fixture
+def make_pipeline(request):
+    """Build a pipeline writing to a StringIO and attach it to a dedicated logger"""
+    def make(queue_size=100, rate=1000.0, burst=1000.0, sample_rates=None, start=True):
+        stream = io.StringIO()
+        pipeline = LogPipeline('test-service', queue_size, rate, burst, sample_rates, stream=stream)
+        logger = logging.getLogger(f'pipeline_test.{request.node.name}')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = [pipeline.handler]
+        if start:
+            pipeline.start()
+        request.addfinalizer(pipeline.stop)
+        return pipeline, logger, stream
+    return make
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_full_queue_drops_instead_of_blocking(make_pipeline):
+    pipeline, logger, stream = make_pipeline(queue_size=3, start=False)
+    for i in range(5):
+        logger.info('record %d', i)
+
+    assert pipeline.stats()['enqueued'] == 3
+    assert pipeline.stats()['dropped_queue_full'] == 2
+
+    pipeline.start()
+    pipeline.stop()
+    assert [entry['message'] for entry in lines(stream)] == ['record 0', 'record 1', 'record 2']
+
+
+def test_token_bucket_limits_each_logger(make_pipeline):
+    pipeline, logger, stream = make_pipeline(rate=0.001, burst=3)
+    for i in range(10):
+        logger.info('record %d', i)
+    pipeline.stop()
+
+    assert len(lines(stream)) == 3
+    assert pipeline.stats()['dropped_rate_limited'] == 7
+
+
+def test_errors_bypass_the_rate_limit_and_sampling(make_pipeline, request):
+    name = f'pipeline_test.{request.node.name}'
+    pipeline, logger, stream = make_pipeline(rate=0.001, burst=1, sample_rates={name: 0.0})
+    for i in range(5):
+        logger.info('dropped %d', i)
+        logger.error('kept %d', i)
+    pipeline.stop()
+
+    assert [entry['message'] for entry in lines(stream)] == [f'kept {i}' for i in range(5)]
+    assert pipeline.stats()['dropped_sampled'] == 5
+
+
+def test_stop_writes_out_queued_records(make_pipeline):
+    pipeline, logger, stream = make_pipeline(queue_size=1000, start=False)
+    for i in range(500):
+        logger.info('record %d', i)
+    pipeline.start()
+    pipeline.stop()
+    pipeline.stop()
+
+    assert len(lines(stream)) == 500
+    assert pipeline.stats()['queue_depth'] == 0
+
+
+def test_json_lines_carry_extra_fields_and_service(make_pipeline, request):
+    pipeline, logger, stream = make_pipeline()
+    pipeline.add_service('other-service', [f'pipeline_test.{request.node.name}.child'])
+    logger.info('Order %s created', 'o-1', extra={'order_id': 'o-1'})
+    logger.getChild('child').getChild('grandchild').warning('from a child')
+    pipeline.stop()
+
+    first, second = lines(stream)
+    assert first['message'] == 'Order o-1 created'
+    assert first['order_id'] == 'o-1'
+    assert first['level'] == 'INFO'
+    assert first['service'] == 'test-service'
+    assert second['service'] == 'other-service'
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates('') == {}
+    assert parse_sample_rates('werkzeug=0.01, app=0.5') == {'werkzeug': 0.01, 'app': 0.5}
+    with pytest.raises(ValueError):
+        parse_sample_rates('werkzeug')
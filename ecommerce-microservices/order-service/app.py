@@ -1,25 +1,31 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import uuid
+import copy
 import datetime
 import os
 import logging
 from typing import Dict, List, Optional
 
+from rollups import GRANULARITIES, SORT_KEYS, OrderRollups, parse_range
+from store import OrderStore
+
+from common.instrumentation import register_instrumentation
+from common.log_pipeline import configure_logging
+
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+log_pipeline = configure_logging('order-service', logger_names=[__name__])
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+metrics = register_instrumentation(app, 'order-service')
+log_pipeline.register_metrics(metrics)
 
 # Configuration
 PORT = int(os.environ.get('PORT', 3000))
 DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
-
-# In-memory storage (in production, use a database like PostgreSQL/MongoDB)
-orders = {}
-order_items = {}
+DB_PATH = os.environ.get('ORDER_DB_PATH', 'orders.db')
 
 # Order status constants
 class OrderStatus:
@@ -44,6 +50,20 @@ class Order:
     def calculate_total(self) -> float:
         return sum(item.get('price', 0) * item.get('quantity', 1) for item in self.items)
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Order':
+        order = cls.__new__(cls)
+        order.id = data['id']
+        order.customer_id = data['customer_id']
+        order.items = data['items']
+        order.shipping_address = data['shipping_address']
+        order.payment_method = data['payment_method']
+        order.status = data['status']
+        order.total_amount = data['total_amount']
+        order.created_at = data['created_at']
+        order.updated_at = data['updated_at']
+        return order
+
     def to_dict(self) -> Dict:
         return {
             'id': self.id,
@@ -62,7 +82,26 @@ class Order:
                          OrderStatus.SHIPPED, OrderStatus.DELIVERED, OrderStatus.CANCELLED]:
             self.status = new_status
             self.updated_at = datetime.datetime.utcnow().isoformat()
-            logger.info(f"Order {self.id} status updated to {new_status}")
+            logger.info("Order %s status updated to %s", self.id, new_status,
+                        extra={'order_id': self.id, 'status': new_status})
+
+# Orders shared by all gunicorn workers through SQLite, with a bounded per-worker cache
+orders = OrderStore(DB_PATH, load=Order.from_dict, dump=Order.to_dict)
+order_items = {}
+
+# Time-bucketed revenue and product rollups, updated in the same transaction as `orders`
+rollups = OrderRollups(orders, cancelled_status=OrderStatus.CANCELLED)
+
+def set_order_status(order: Order, new_status: str) -> Order:
+    """Save a copy of `order` with the new status and return it.
+
+    The order passed in may be shared through the store's cache, so it is
+    left untouched; the copy replaces it there only once the write commits.
+    """
+    updated = copy.copy(order)
+    updated.update_status(new_status)
+    orders.save(updated)
+    return updated
 
 # Function to create sample orders
 def create_sample_orders():
@@ -147,17 +186,17 @@ def create_sample_orders():
             shipping_address=order_data['shipping_address'],
             payment_method=order_data['payment_method']
         )
-        orders[order.id] = order
-        logger.info(f"Sample order created: {order.id} for customer: {order_data['customer_id']}")
+        orders.save(order)
+        logger.info("Sample order created: %s for customer: %s", order.id, order_data['customer_id'])
 
     # Update some orders to different statuses for variety
-    order_list = list(orders.values())
+    order_list = orders.find()
     if len(order_list) >= 2:
-        order_list[1].update_status(OrderStatus.PROCESSING)
+        set_order_status(order_list[1], OrderStatus.PROCESSING)
         if len(order_list) >= 3:
-            order_list[2].update_status(OrderStatus.SHIPPED)
+            set_order_status(order_list[2], OrderStatus.SHIPPED)
 
-    logger.info(f"Created {len(orders)} sample orders with various statuses")
+    logger.info("Created %d sample orders with various statuses", len(orders))
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
@@ -205,8 +244,9 @@ def create_order():
             payment_method=data['payment_method']
         )
 
-        orders[order.id] = order
-        logger.info(f"New order created: {order.id} for customer: {data['customer_id']}")
+        orders.save(order)
+        logger.info("New order created: %s for customer: %s", order.id, data['customer_id'],
+                    extra={'order_id': order.id, 'customer_id': data['customer_id']})
 
         return jsonify({
             'message': 'Order created successfully',
@@ -214,7 +254,7 @@ def create_order():
         }), 201
 
     except Exception as e:
-        logger.error(f"Error creating order: {str(e)}")
+        logger.error("Error creating order: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 # Get all orders
@@ -224,13 +264,7 @@ def get_orders():
         customer_id = request.args.get('customer_id')
         status = request.args.get('status')
 
-        filtered_orders = list(orders.values())
-
-        if customer_id:
-            filtered_orders = [order for order in filtered_orders if order.customer_id == customer_id]
-
-        if status:
-            filtered_orders = [order for order in filtered_orders if order.status == status]
+        filtered_orders = orders.find(customer_id=customer_id, status=status)
 
         return jsonify({
             'orders': [order.to_dict() for order in filtered_orders],
@@ -238,7 +272,7 @@ def get_orders():
         })
 
     except Exception as e:
-        logger.error(f"Error retrieving orders: {str(e)}")
+        logger.error("Error retrieving orders: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 # Get order by ID
@@ -252,7 +286,7 @@ def get_order(order_id):
         return jsonify({'order': order.to_dict()})
 
     except Exception as e:
-        logger.error(f"Error retrieving order {order_id}: {str(e)}")
+        logger.error("Error retrieving order %s: %s", order_id, e)
         return jsonify({'error': 'Internal server error'}), 500
 
 # Update order status
@@ -275,7 +309,7 @@ def update_order_status(order_id):
         if new_status not in valid_statuses:
             return jsonify({'error': f'Invalid status. Valid statuses: {valid_statuses}'}), 400
 
-        order.update_status(new_status)
+        order = set_order_status(order, new_status)
 
         return jsonify({
             'message': 'Order status updated successfully',
@@ -283,7 +317,7 @@ def update_order_status(order_id):
         })
 
     except Exception as e:
-        logger.error(f"Error updating order status {order_id}: {str(e)}")
+        logger.error("Error updating order status %s: %s", order_id, e)
         return jsonify({'error': 'Internal server error'}), 500
 
 # Cancel order
@@ -297,7 +331,7 @@ def cancel_order(order_id):
         if order.status in [OrderStatus.SHIPPED, OrderStatus.DELIVERED]:
             return jsonify({'error': 'Cannot cancel shipped or delivered orders'}), 400
 
-        order.update_status(OrderStatus.CANCELLED)
+        order = set_order_status(order, OrderStatus.CANCELLED)
 
         return jsonify({
             'message': 'Order cancelled successfully',
@@ -305,22 +339,18 @@ def cancel_order(order_id):
         })
 
     except Exception as e:
-        logger.error(f"Error cancelling order {order_id}: {str(e)}")
+        logger.error("Error cancelling order %s: %s", order_id, e)
         return jsonify({'error': 'Internal server error'}), 500
 
 # Get order statistics
 @app.route('/orders/stats', methods=['GET'])
 def get_order_stats():
     try:
-        total_orders = len(orders)
-        status_counts = {}
-        total_revenue = 0
-
-        for order in orders.values():
-            status = order.status
-            status_counts[status] = status_counts.get(status, 0) + 1
-            if order.status != OrderStatus.CANCELLED:
-                total_revenue += order.total_amount
+        totals = orders.status_totals()
+        total_orders = sum(count for count, _ in totals.values())
+        status_counts = {status: count for status, (count, _) in totals.items()}
+        total_revenue = sum(revenue for status, (_, revenue) in totals.items()
+                            if status != OrderStatus.CANCELLED)
 
         return jsonify({
             'total_orders': total_orders,
@@ -330,7 +360,73 @@ def get_order_stats():
         })
 
     except Exception as e:
-        logger.error(f"Error getting order statistics: {str(e)}")
+        logger.error("Error getting order statistics: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def _read_granularity(default: str) -> str:
+    granularity = request.args.get('granularity', default)
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Invalid granularity. Valid granularities: {list(GRANULARITIES)}')
+    return granularity
+
+# Get order count and revenue per time bucket
+@app.route('/orders/stats/timeseries', methods=['GET'])
+def get_order_timeseries():
+    try:
+        try:
+            granularity = _read_granularity('hour')
+            start, end = parse_range(request.args, granularity, default_buckets=24)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        buckets = rollups.timeseries(granularity, start, end)
+
+        return jsonify({
+            'granularity': granularity,
+            'start': datetime.datetime.utcfromtimestamp(start).isoformat(),
+            'end': datetime.datetime.utcfromtimestamp(end).isoformat(),
+            'buckets': buckets,
+            'total_orders': sum(bucket['orders'] for bucket in buckets),
+            'total_revenue': round(sum(bucket['revenue'] for bucket in buckets), 2)
+        })
+
+    except Exception as e:
+        logger.error("Error getting order timeseries: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Get best selling products over a time range
+@app.route('/orders/stats/top-products', methods=['GET'])
+def get_top_products():
+    try:
+        try:
+            granularity = _read_granularity('day')
+            start, end = parse_range(request.args, granularity, default_buckets=7)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+
+        sort_by = request.args.get('by', 'revenue')
+        if sort_by not in SORT_KEYS:
+            return jsonify({'error': f'Invalid sort key. Valid keys: {", ".join(SORT_KEYS)}'}), 400
+
+        products = rollups.top_products(granularity, start, end, limit=limit, by=sort_by)
+
+        return jsonify({
+            'granularity': granularity,
+            'start': datetime.datetime.utcfromtimestamp(start).isoformat(),
+            'end': datetime.datetime.utcfromtimestamp(end).isoformat(),
+            'by': sort_by,
+            'products': products
+        })
+
+    except Exception as e:
+        logger.error("Error getting top products: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 # Error handlers
@@ -344,13 +440,14 @@ def method_not_allowed(error):
 
 @app.errorhandler(500)
 def internal_error(error):
-    logger.error(f"Internal server error: {str(error)}")
+    logger.error("Internal server error: %s", error)
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
-    # Create sample orders when the app starts
-    create_sample_orders()
+    # Create sample orders when the app starts against an empty store
+    if len(orders) == 0:
+        create_sample_orders()
 
-    logger.info(f"Starting Order Service on port {PORT}")
-    logger.info(f"Sample orders created: {len(orders)} orders loaded")
+    logger.info("Starting Order Service on port %s", PORT)
+    logger.info("Sample orders created: %d orders loaded", len(orders))
     app.run(host='0.0.0.0', port=PORT, debug=DEBUG)
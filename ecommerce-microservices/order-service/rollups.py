@@ -0,0 +1,195 @@
+import datetime
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Bucket widths in seconds, keyed by granularity name
+GRANULARITIES = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+# How long buckets are kept per granularity (None keeps them forever)
+RETENTION = {
+    'minute': datetime.timedelta(days=2),
+    'hour': datetime.timedelta(days=90),
+    'day': None
+}
+
+# product_id has no declared type so ints and strings round-trip unchanged
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_totals (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    orders INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (granularity, bucket)
+);
+CREATE TABLE IF NOT EXISTS rollup_products (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    product_id NOT NULL,
+    name TEXT,
+    quantity INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (granularity, bucket, product_id)
+);
+"""
+
+SORT_KEYS = ('revenue', 'quantity')
+
+
+def to_epoch(timestamp: str) -> int:
+    """Convert a naive UTC ISO timestamp (as stored on orders) to epoch seconds"""
+    parsed = datetime.datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
+
+
+def utc_now_epoch() -> int:
+    return int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+
+
+def to_iso(epoch: int) -> str:
+    return datetime.datetime.utcfromtimestamp(epoch).isoformat()
+
+
+class OrderRollups:
+    """Pre-aggregated order counts, revenue and product sales per time bucket.
+
+    The rollup tables live in the order store's SQLite database and are
+    updated in the same transaction as each order write: orders are folded
+    in when created (or reinstated) and folded back out when cancelled. Range
+    queries only read the buckets in the range and never look at raw orders,
+    and every worker sees the same figures.
+    """
+
+    def __init__(self, store, cancelled_status: str = 'cancelled'):
+        self.store = store
+        self.cancelled_status = cancelled_status
+        self._last_pruned = 0.0
+        store.register(schema=SCHEMA, on_write=self.track)
+
+    def track(self, conn, changes: List[Tuple[object, Optional[str]]]):
+        """Store write hook: apply the rollup delta of each (order, previous_status)"""
+        deltas = []
+        for order, previous_status in changes:
+            was_counted = previous_status is not None and previous_status != self.cancelled_status
+            is_counted = order.status != self.cancelled_status
+            if is_counted and not was_counted:
+                deltas.append((order, 1))
+            elif was_counted and not is_counted:
+                deltas.append((order, -1))
+        if deltas:
+            self.apply(conn, deltas)
+
+    def apply(self, conn, deltas: List[Tuple[object, int]]):
+        """Add each order's contribution times its sign (+1/-1) to the rollup tables"""
+        now = utc_now_epoch()
+        totals: Dict[Tuple[str, int], List] = {}
+        products: Dict[Tuple[str, int, object], List] = {}
+
+        for order, sign in deltas:
+            created = to_epoch(order.created_at)
+            for granularity, width in GRANULARITIES.items():
+                bucket = created - created % width
+                retention = RETENTION[granularity]
+                if retention is not None and bucket < now - retention.total_seconds():
+                    continue
+
+                total = totals.setdefault((granularity, bucket), [0, 0.0])
+                total[0] += sign
+                total[1] += sign * order.total_amount
+
+                for item in order.items:
+                    quantity = item.get('quantity', 1)
+                    entry = products.setdefault((granularity, bucket, item['product_id']),
+                                                [item.get('name'), 0, 0.0])
+                    entry[1] += sign * quantity
+                    entry[2] += sign * item.get('price', 0) * quantity
+
+        conn.executemany(
+            'INSERT INTO rollup_totals (granularity, bucket, orders, revenue) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (granularity, bucket) DO UPDATE SET '
+            'orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+            [(granularity, bucket, count, revenue) for (granularity, bucket), (count, revenue) in totals.items()]
+        )
+        conn.executemany(
+            'INSERT INTO rollup_products (granularity, bucket, product_id, name, quantity, revenue) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (granularity, bucket, product_id) DO UPDATE SET '
+            'quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue',
+            [(granularity, bucket, product_id, name, quantity, revenue)
+             for (granularity, bucket, product_id), (name, quantity, revenue) in products.items()]
+        )
+
+        # Pruning is cheap but pointless more often than the finest bucket width
+        if time.monotonic() - self._last_pruned >= GRANULARITIES['minute']:
+            self.prune(conn, now)
+            self._last_pruned = time.monotonic()
+
+    def prune(self, conn, now: int):
+        """Drop buckets older than their granularity's retention"""
+        for granularity, retention in RETENTION.items():
+            if retention is None:
+                continue
+            cutoff = now - retention.total_seconds()
+            conn.execute('DELETE FROM rollup_totals WHERE granularity = ? AND bucket < ?', (granularity, cutoff))
+            conn.execute('DELETE FROM rollup_products WHERE granularity = ? AND bucket < ?', (granularity, cutoff))
+
+    def timeseries(self, granularity: str, start: int, end: int) -> List[Dict]:
+        """Order count and revenue for every non-empty bucket overlapping [start, end)"""
+        # A bucket overlaps [start, end) if it starts before end and ends after start
+        rows = self.store.query(
+            'SELECT bucket, orders, revenue FROM rollup_totals '
+            'WHERE granularity = ? AND bucket > ? AND bucket < ? AND orders != 0 ORDER BY bucket',
+            (granularity, start - GRANULARITIES[granularity], end)
+        )
+        return [
+            {'bucket_start': to_iso(bucket), 'orders': orders, 'revenue': round(revenue, 2)}
+            for bucket, orders, revenue in rows
+        ]
+
+    def top_products(self, granularity: str, start: int, end: int,
+                     limit: int = 20, by: str = 'revenue') -> List[Dict]:
+        """Best selling products across all buckets overlapping [start, end)"""
+        if by not in SORT_KEYS:
+            raise ValueError(f'Invalid sort key. Valid keys: {", ".join(SORT_KEYS)}')
+
+        rows = self.store.query(
+            'SELECT product_id, MAX(name), SUM(quantity) AS quantity, SUM(revenue) AS revenue '
+            'FROM rollup_products WHERE granularity = ? AND bucket > ? AND bucket < ? '
+            f'GROUP BY product_id HAVING SUM(quantity) > 0 ORDER BY {by} DESC, product_id LIMIT ?',
+            (granularity, start - GRANULARITIES[granularity], end, limit)
+        )
+        return [
+            {'product_id': product_id, 'name': name, 'quantity': quantity, 'revenue': round(revenue, 2)}
+            for product_id, name, quantity, revenue in rows
+        ]
+
+
+def parse_range(args, granularity: str, default_buckets: int):
+    """Read start/end query parameters, defaulting to the last few buckets up to now.
+
+    Every bucket overlapping the range is counted whole, so the range is
+    widened to bucket boundaries to match what is actually covered.
+    Returns (start, end) as epoch seconds, or raises ValueError on bad input.
+    """
+    width = GRANULARITIES[granularity]
+    end_arg: Optional[str] = args.get('end')
+    start_arg: Optional[str] = args.get('start')
+
+    try:
+        end = to_epoch(end_arg) if end_arg else utc_now_epoch() + 1
+        start = to_epoch(start_arg) if start_arg else None
+    except ValueError:
+        raise ValueError('start and end must be ISO 8601 timestamps')
+
+    if start is not None and start >= end:
+        raise ValueError('start must be before end')
+
+    end = -(-end // width) * width
+    if start is None:
+        return end - default_buckets * width, end
+    return start - start % width, end
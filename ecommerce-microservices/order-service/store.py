@@ -0,0 +1,193 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    customer_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_version ON orders (version);
+CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer_id);
+CREATE INDEX IF NOT EXISTS orders_status ON orders (status, total_amount);
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version (id, version) VALUES (0, 0);
+"""
+
+DEFAULT_CACHE_SIZE = int(os.environ.get('ORDER_CACHE_SIZE', 10000))
+
+
+class OrderStore:
+    """Order storage shared by every worker process through a SQLite WAL database.
+
+    SQLite is the source of truth: lookups by id go through a bounded
+    in-process LRU cache, and filtered listings and aggregates are answered
+    by SQL. Every write bumps a store-wide version and stamps the row with
+    it; before a cached read the store checks SQLite's data_version and, if
+    another process has committed since, evicts only the ids written with a
+    newer version stamp.
+
+    Cached orders are shared between callers and must not be mutated; save a
+    modified copy instead, which replaces the cached entry once committed.
+
+    Other modules can add tables with `register(schema=...)` and keep them in
+    step with orders through `on_write(conn, changes)` hooks, which run
+    inside the write transaction with `changes` as (order, previous_status)
+    pairs; `previous_status` is None for new orders.
+    """
+
+    def __init__(self, path: str, load: Callable[[Dict], object],
+                 dump: Callable[[object], Dict], cache_size: int = DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._load = load
+        self._dump = dump
+        self._schemas: List[str] = [SCHEMA]
+        self._write_hooks: List[Callable] = []
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._data_version: Optional[int] = None
+        self._version = 0
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+
+    def register(self, schema: Optional[str] = None, on_write: Optional[Callable] = None):
+        if schema is not None:
+            self._schemas.append(schema)
+        if on_write is not None:
+            self._write_hooks.append(on_write)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not be shared across fork(), so reopen in each worker
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for schema in self._schemas:
+                conn.executescript(schema)
+            self._conn = conn
+            self._pid = os.getpid()
+            self._cache = collections.OrderedDict()
+            self._data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            self._version = conn.execute('SELECT version FROM store_version WHERE id = 0').fetchone()[0]
+        return self._conn
+
+    def _sync(self, conn: sqlite3.Connection):
+        """Evict cached orders that other processes have written since the last sync"""
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        rows = conn.execute('SELECT id, version FROM orders WHERE version > ?', (self._version,))
+        for order_id, version in rows:
+            self._cache.pop(order_id, None)
+            self._version = max(self._version, version)
+
+    def _cache_put(self, order):
+        self._cache[order.id] = order
+        self._cache.move_to_end(order.id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        """Run a read-only query against the store's connection"""
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def get(self, order_id: str):
+        with self._lock:
+            conn = self._connect()
+            self._sync(conn)
+            order = self._cache.get(order_id)
+            if order is not None:
+                self._cache.move_to_end(order_id)
+                return order
+
+            row = conn.execute('SELECT data FROM orders WHERE id = ?', (order_id,)).fetchone()
+            if row is None:
+                return None
+            order = self._load(json.loads(row[0]))
+            self._cache_put(order)
+            return order
+
+    def find(self, customer_id: Optional[str] = None, status: Optional[str] = None) -> List:
+        """Orders matching the given filters, oldest write first"""
+        clauses, params = [], []
+        if customer_id:
+            clauses.append('customer_id = ?')
+            params.append(customer_id)
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        rows = self.query(f'SELECT data FROM orders {where} ORDER BY version', tuple(params))
+        return [self._load(json.loads(data)) for (data,) in rows]
+
+    def status_totals(self) -> Dict[str, Tuple[int, float]]:
+        """Order count and summed total_amount per status"""
+        rows = self.query('SELECT status, COUNT(*), SUM(total_amount) FROM orders GROUP BY status')
+        return {status: (count, total or 0.0) for status, count, total in rows}
+
+    def __len__(self) -> int:
+        return self.query('SELECT COUNT(*) FROM orders')[0][0]
+
+    def save(self, order):
+        """Insert or update an order and make it visible to every worker"""
+        self.save_many([order])
+
+    def save_many(self, orders: List):
+        """Insert or update a batch of orders in a single transaction"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Holding the write lock, catch up first so no other worker's
+                # versions are skipped when we advance past our own
+                self._sync(conn)
+                version = conn.execute('SELECT version FROM store_version WHERE id = 0').fetchone()[0]
+
+                changes = []
+                rows = []
+                # Statuses written earlier in this batch are not in the table yet
+                batch_statuses: Dict[str, str] = {}
+                for order in orders:
+                    if order.id in batch_statuses:
+                        previous_status = batch_statuses[order.id]
+                    else:
+                        previous = conn.execute('SELECT status FROM orders WHERE id = ?', (order.id,)).fetchone()
+                        previous_status = previous[0] if previous else None
+                    changes.append((order, previous_status))
+                    batch_statuses[order.id] = order.status
+                    version += 1
+                    rows.append((order.id, version, order.customer_id, order.status,
+                                 order.total_amount, json.dumps(self._dump(order))))
+
+                conn.executemany(
+                    'INSERT OR REPLACE INTO orders (id, version, customer_id, status, total_amount, data) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+                conn.execute('UPDATE store_version SET version = ? WHERE id = 0', (version,))
+                for hook in self._write_hooks:
+                    hook(conn, changes)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+            self._version = version
+            for order in orders:
+                self._cache_put(order)
@@ -0,0 +1,67 @@
+import copy
+import datetime
+import os
+import sqlite3
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rollups import OrderRollups
+from store import OrderStore
+
+
+class FakeOrder:
+    """Just the attributes the store and rollups read from app.Order"""
+
+    def __init__(self, items, status='pending', customer_id='customer_001',
+                 created_at=None, order_id=None):
+        self.id = order_id or str(uuid.uuid4())
+        self.customer_id = customer_id
+        self.items = items
+        self.status = status
+        self.total_amount = sum(item['price'] * item['quantity'] for item in items)
+        self.created_at = (created_at or datetime.datetime.utcnow()).isoformat()
+        self.updated_at = self.created_at
+
+    @classmethod
+    def from_dict(cls, data):
+        order = cls.__new__(cls)
+        order.__dict__.update(data)
+        return order
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def item(product_id, price, quantity=1):
+    return {'product_id': product_id, 'name': f'Product {product_id}', 'price': price, 'quantity': quantity}
+
+
+def with_status(order, status):
+    """A copy of `order` with a new status, leaving the (possibly cached) original alone"""
+    updated = copy.copy(order)
+    updated.status = status
+    return updated
+
+
+def open_store(path):
+    store = OrderStore(path, load=FakeOrder.from_dict, dump=FakeOrder.to_dict)
+    return store, OrderRollups(store)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'orders.db')
+
+
+@pytest.fixture
+def insert_rollup_total(db_path):
+    """Write a rollup_totals row directly, as if it had been written long ago"""
+    def insert(granularity, bucket, orders=1, revenue=1.0):
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('INSERT INTO rollup_totals (granularity, bucket, orders, revenue) VALUES (?, ?, ?, ?)',
+                         (granularity, bucket, orders, revenue))
+    return insert
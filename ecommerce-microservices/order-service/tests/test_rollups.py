@@ -0,0 +1,131 @@
+import datetime
+
+import pytest
+
+from conftest import FakeOrder, item, open_store, with_status
+from rollups import GRANULARITIES, parse_range, to_epoch
+
+NOW = datetime.datetime.utcnow().replace(second=30, microsecond=0)
+
+
+def window(granularity, buckets=3):
+    end = to_epoch(NOW.isoformat()) + 1
+    return end - buckets * GRANULARITIES[granularity], end
+
+
+def test_created_orders_are_counted_in_every_granularity(db_path):
+    store, rollups = open_store(db_path)
+    store.save(FakeOrder([item(1, 10.0, 2)], created_at=NOW))
+    store.save(FakeOrder([item(2, 5.0)], created_at=NOW))
+
+    for granularity in GRANULARITIES:
+        buckets = rollups.timeseries(granularity, *window(granularity))
+        assert [(b['orders'], b['revenue']) for b in buckets] == [(2, 25.0)]
+
+
+def test_cancel_retracts_and_reinstate_records_again(db_path):
+    store, rollups = open_store(db_path)
+    kept = FakeOrder([item(1, 10.0)], created_at=NOW)
+    cancelled = FakeOrder([item(2, 7.0, 3)], created_at=NOW)
+    store.save_many([kept, cancelled])
+
+    cancelled = with_status(cancelled, 'cancelled')
+    store.save(cancelled)
+    assert rollups.timeseries('hour', *window('hour'))[0]['orders'] == 1
+    assert [p['product_id'] for p in rollups.top_products('day', *window('day'))] == [1]
+
+    # Moving between non-cancelled statuses must not count the order twice
+    kept = with_status(kept, 'shipped')
+    store.save(kept)
+    assert rollups.timeseries('hour', *window('hour'))[0]['orders'] == 1
+
+    store.save(with_status(cancelled, 'pending'))
+    bucket = rollups.timeseries('hour', *window('hour'))[0]
+    assert (bucket['orders'], bucket['revenue']) == (2, 31.0)
+
+
+def test_orders_created_cancelled_are_never_counted(db_path):
+    store, rollups = open_store(db_path)
+    store.save(FakeOrder([item(1, 10.0)], status='cancelled', created_at=NOW))
+
+    assert rollups.timeseries('day', *window('day')) == []
+    assert rollups.top_products('day', *window('day')) == []
+
+
+def test_range_includes_overlapping_buckets_only(db_path):
+    store, rollups = open_store(db_path)
+    hour = NOW.replace(minute=0, second=0)
+    store.save(FakeOrder([item(1, 1.0)], created_at=hour - datetime.timedelta(minutes=30)))
+    store.save(FakeOrder([item(1, 2.0)], created_at=hour + datetime.timedelta(minutes=10)))
+
+    # Starting mid-way through the previous hour still includes that bucket
+    start = to_epoch((hour - datetime.timedelta(minutes=15)).isoformat())
+    assert len(rollups.timeseries('hour', start, to_epoch(hour.isoformat()) + 3600)) == 2
+
+    # A range ending exactly where a bucket starts excludes it
+    buckets = rollups.timeseries('hour', start, to_epoch(hour.isoformat()))
+    assert [b['revenue'] for b in buckets] == [1.0]
+
+
+def test_top_products_sorts_and_limits(db_path):
+    store, rollups = open_store(db_path)
+    store.save(FakeOrder([item('cheap', 1.0, 10), item('dear', 100.0)], created_at=NOW))
+    store.save(FakeOrder([item('dear', 100.0), item('mid', 20.0, 2)], created_at=NOW))
+
+    by_revenue = rollups.top_products('day', *window('day'))
+    assert [p['product_id'] for p in by_revenue] == ['dear', 'mid', 'cheap']
+    assert by_revenue[0] == {'product_id': 'dear', 'name': 'Product dear', 'quantity': 2, 'revenue': 200.0}
+
+    by_quantity = rollups.top_products('day', *window('day'), limit=1, by='quantity')
+    assert [p['product_id'] for p in by_quantity] == ['cheap']
+
+    with pytest.raises(ValueError):
+        rollups.top_products('day', *window('day'), by='name')
+
+
+def test_product_ids_keep_their_type(db_path):
+    store, rollups = open_store(db_path)
+    store.save(FakeOrder([item(7, 1.0), item('7', 2.0)], created_at=NOW))
+
+    product_ids = {p['product_id'] for p in rollups.top_products('day', *window('day'))}
+    assert product_ids == {7, '7'}
+
+
+def test_retention_skips_and_prunes_old_minute_buckets(db_path, insert_rollup_total):
+    store, rollups = open_store(db_path)
+    old = NOW - datetime.timedelta(days=3)
+    store.save(FakeOrder([item(1, 4.0)], created_at=old))
+
+    start = to_epoch(old.isoformat()) - 60
+    assert rollups.timeseries('minute', start, start + 180) == []
+    assert len(rollups.timeseries('hour', start, start + 7200)) == 1
+    assert len(rollups.timeseries('day', start, start + 86400)) == 1
+
+    # A minute bucket that aged out since it was written is deleted on the next prune
+    stale = to_epoch((NOW - datetime.timedelta(days=2, minutes=5)).isoformat()) // 60 * 60
+    insert_rollup_total('minute', stale)
+    rollups._last_pruned = 0.0
+    store.save(FakeOrder([item(1, 1.0)], created_at=NOW))
+
+    assert store.query("SELECT COUNT(*) FROM rollup_totals WHERE granularity = 'minute' AND bucket = ?",
+                       (stale,))[0][0] == 0
+
+
+def test_parse_range_widens_to_whole_buckets():
+    start, end = parse_range({}, 'day', 7)
+    assert end - start == 7 * 86400
+    assert start % 86400 == 0 and end % 86400 == 0
+    assert end > to_epoch(datetime.datetime.utcnow().isoformat())
+
+    start, end = parse_range({'start': '2026-01-01T00:00:00', 'end': '2026-01-02T00:00:00Z'}, 'day', 7)
+    assert (start, end) == (to_epoch('2026-01-01T00:00:00'), to_epoch('2026-01-02T00:00:00'))
+
+    start, end = parse_range({'start': '2026-01-01T10:15:00', 'end': '2026-01-01T12:30:00'}, 'hour', 24)
+    assert (start, end) == (to_epoch('2026-01-01T10:00:00'), to_epoch('2026-01-01T13:00:00'))
+
+
+def test_parse_range_rejects_bad_input():
+    with pytest.raises(ValueError, match='start must be before end'):
+        parse_range({'start': '2026-01-02T00:00:00', 'end': '2026-01-01T00:00:00'}, 'day', 7)
+    with pytest.raises(ValueError, match='ISO 8601'):
+        parse_range({'start': 'yesterday'}, 'day', 7)
@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+
+from conftest import FakeOrder, item, open_store, with_status
+from rollups import to_epoch
+
+NOW = datetime.datetime.utcnow().replace(microsecond=0)
+START = to_epoch(NOW.isoformat()) - 86400
+END = to_epoch(NOW.isoformat()) + 86400
+
+
+def test_write_in_one_store_is_visible_in_another(db_path):
+    a, _ = open_store(db_path)
+    b, _ = open_store(db_path)
+    order = FakeOrder([item(1, 10.0)], created_at=NOW)
+    a.save(order)
+
+    assert b.get(order.id).status == 'pending'
+    assert len(b) == 1
+
+
+def test_update_in_one_store_invalidates_the_others_cache(db_path):
+    a, _ = open_store(db_path)
+    b, _ = open_store(db_path)
+    order = FakeOrder([item(1, 10.0)], created_at=NOW)
+    a.save(order)
+    cached = b.get(order.id)
+
+    a.save(with_status(order, 'shipped'))
+
+    assert cached.status == 'pending'
+    assert b.get(order.id).status == 'shipped'
+    assert b.get(order.id) is b.get(order.id)
+
+
+def test_rollups_stay_consistent_across_stores(db_path):
+    a, rollups_a = open_store(db_path)
+    b, rollups_b = open_store(db_path)
+    order = FakeOrder([item('p1', 10.0, 2)], created_at=NOW)
+    a.save(order)
+    a.save(FakeOrder([item('p2', 5.0)], created_at=NOW))
+
+    b.save(with_status(b.get(order.id), 'cancelled'))
+    for rollups in (rollups_a, rollups_b):
+        assert [p['product_id'] for p in rollups.top_products('day', START, END)] == ['p2']
+        assert sum(bucket['orders'] for bucket in rollups.timeseries('hour', START, END)) == 1
+
+    a.save(with_status(a.get(order.id), 'pending'))
+    for rollups in (rollups_a, rollups_b):
+        assert [p['product_id'] for p in rollups.top_products('day', START, END)] == ['p1', 'p2']
+        assert sum(bucket['revenue'] for bucket in rollups.timeseries('hour', START, END)) == 25.0
+
+
+def test_find_status_totals_and_len(db_path):
+    store, _ = open_store(db_path)
+    first = FakeOrder([item(1, 10.0)], customer_id='alice', created_at=NOW)
+    second = FakeOrder([item(1, 4.0)], customer_id='bob', status='shipped', created_at=NOW)
+    third = FakeOrder([item(1, 1.0)], customer_id='alice', status='shipped', created_at=NOW)
+    store.save_many([first, second, third])
+
+    assert [o.id for o in store.find()] == [first.id, second.id, third.id]
+    assert [o.id for o in store.find(customer_id='alice')] == [first.id, third.id]
+    assert [o.id for o in store.find(customer_id='alice', status='shipped')] == [third.id]
+    assert store.status_totals() == {'pending': (1, 10.0), 'shipped': (2, 5.0)}
+    assert len(store) == 3
+
+    # Updated orders move to the end of the listing
+    store.save(with_status(first, 'shipped'))
+    assert [o.id for o in store.find(status='shipped')] == [second.id, third.id, first.id]
+
+
+def test_failed_write_hook_rolls_back(db_path):
+    store, rollups = open_store(db_path)
+    order = FakeOrder([item(1, 10.0)], created_at=NOW)
+    store.save(order)
+
+    def fail(conn, changes):
+        raise RuntimeError('hook failed')
+
+    store.register(on_write=fail)
+    with pytest.raises(RuntimeError):
+        store.save(with_status(order, 'cancelled'))
+
+    assert store.get(order.id).status == 'pending'
+    assert store.query('SELECT status FROM orders WHERE id = ?', (order.id,)) == [('pending',)]
+    assert sum(bucket['orders'] for bucket in rollups.timeseries('hour', START, END)) == 1
+
+
+def test_repeated_ids_in_one_batch(db_path):
+    store, rollups = open_store(db_path)
+    order = FakeOrder([item(1, 10.0)], created_at=NOW)
+
+    store.save_many([order, with_status(order, 'cancelled'), with_status(order, 'shipped')])
+
+    assert store.get(order.id).status == 'shipped'
+    assert len(store) == 1
+    assert [bucket['orders'] for bucket in rollups.timeseries('day', START, END)] == [1]
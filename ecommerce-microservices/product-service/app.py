@@ -1,10 +1,20 @@
 from flask import Flask, request, jsonify
+import logging
 import os
 import signal
 import sys
 from datetime import datetime
 
+from common.instrumentation import register_instrumentation
+from common.log_pipeline import configure_logging
+
+# Configure logging
+log_pipeline = configure_logging('product-service', logger_names=[__name__])
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
+metrics = register_instrumentation(app, 'product-service')
+log_pipeline.register_metrics(metrics)
 
 # In-memory storage for simplicity
 products = [
@@ -107,7 +117,7 @@ def internal_error(error):
 
 # Graceful shutdown handler
 def signal_handler(sig, frame):
-    print('Received shutdown signal, exiting gracefully...')
+    logger.info('Received shutdown signal, exiting gracefully...')
     sys.exit(0)
 
 signal.signal(signal.SIGTERM, signal_handler)